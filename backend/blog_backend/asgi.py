@@ -1,7 +1,16 @@
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
+from blog_backend.concurrency import ReadConcurrencyLimiter
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_backend.settings')
 
-application = get_asgi_application()
+application = ReadConcurrencyLimiter(
+    get_asgi_application(),
+    limit=settings.ASGI_READ_CONCURRENCY,
+    paths=settings.ASGI_READ_PATHS,
+    timeout=settings.ASGI_READ_QUEUE_TIMEOUT,
+    other_limit=settings.ASGI_OTHER_CONCURRENCY,
+)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from asgiref.sync import ThreadSensitiveContext
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class ReadConcurrencyLimiter:
+    """ASGI-обертка для синхронных представлений Django.
+
+    Каждый запрос получает свой ThreadSensitiveContext, поэтому
+    синхронные view выполняются в отдельных потоках, а не по очереди в
+    одном общем, как делает ASGIHandler Django 3.2. Число одновременных
+    чтений горячих путей ограничено limit, остальных запросов (записи,
+    прочие пути) - other_limit, так что потоков и соединений с БД не
+    больше limit + other_limit. Запрос, не дождавшийся места за timeout
+    секунд, получает 503.
+    """
+
+    def __init__(self, app, limit, paths, timeout, other_limit):
+        self.app = app
+        self.limit = limit
+        self.other_limit = other_limit
+        self.paths = tuple(paths)
+        self.timeout = timeout
+        self._semaphores = {}
+
+    def _is_hot_read(self, scope):
+        return scope['method'] in READ_METHODS and scope['path'].startswith(
+            self.paths
+        )
+
+    def _get_semaphore(self, scope):
+        """Семафор группы запроса или None, если группа не ограничена."""
+        hot_read = self._is_hot_read(scope)
+        limit = self.limit if hot_read else self.other_limit
+        if limit <= 0:
+            return None
+        if hot_read not in self._semaphores:
+            self._semaphores[hot_read] = asyncio.Semaphore(limit)
+        return self._semaphores[hot_read]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        async with ThreadSensitiveContext():
+            semaphore = self._get_semaphore(scope)
+            if semaphore is None:
+                return await self.app(scope, receive, send)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return await self._unavailable(send)
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                semaphore.release()
+
+    @staticmethod
+    async def _unavailable(send):
+        body = json.dumps(
+            {'errors': 'Сервер перегружен, повторите запрос позже.'},
+            ensure_ascii=False,
+        ).encode()
+        await send(
+            {
+                'type': 'http.response.start',
+                'status': 503,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'retry-after', b'1'),
+                ],
+            }
+        )
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,25 @@
+class CounterFieldsMixin:
+    """Сохранение записи без денормализованных счетчиков.
+
+    Счетчики меняются только запросами UPDATE ... SET field = field + 1,
+    поэтому полное сохранение существующей записи не перезаписывает их
+    значениями, прочитанными в начале запроса. Явно переданный
+    update_fields не меняется.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,143 @@
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """Пул соединений, который ждет освобождения вместо ошибки.
+
+    Если за timeout секунд соединение не освободилось, поднимается
+    OperationalError.
+    """
+
+    def __init__(self, maxconn, timeout, **conn_params):
+        super().__init__(0, maxconn, **conn_params)
+        # Соединения открываются по требованию, а возвращенные в пул
+        # хранятся до maxconn штук, а не закрываются сверх minconn.
+        self.minconn = maxconn
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(
+                'Нет свободных соединений в пуле.'
+            )
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с проверкой соединений и необязательным пулом.
+
+    CONN_HEALTH_CHECKS: перед первым запросом в каждом HTTP-запросе
+    постоянное соединение проверяется SELECT 1 и переоткрывается, если
+    оно оборвалось. POOL_SIZE: соединения берутся из пула процесса и
+    возвращаются в него при закрытии вместо разрыва.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.settings_dict.get('POOL_SIZE') and (
+            self.settings_dict['CONN_MAX_AGE'] != 0
+        ):
+            # Слот пула освобождается только при закрытии соединения, а
+            # постоянные соединения потоков ASGI не закрываются никогда.
+            raise ImproperlyConfigured(
+                'POOL_SIZE требует CONN_MAX_AGE = 0 '
+                f'(база {self.alias}).'
+            )
+        self.health_check_done = False
+        self.pool = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self, conn_params):
+        size = self.settings_dict.get('POOL_SIZE') or 0
+        if not size:
+            return None
+        key = (self.alias, os.getpid())
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = BlockingConnectionPool(
+                    size,
+                    self.settings_dict.get('POOL_TIMEOUT', 5),
+                    **conn_params,
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+        connection = self.pool.getconn()
+        if self.health_check_enabled and not self._is_alive(connection):
+            self.pool.putconn(connection, close=True)
+            connection = self.pool.getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        base.psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    @staticmethod
+    def _is_alive(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
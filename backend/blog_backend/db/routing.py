@@ -0,0 +1,135 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+_read_alias = ContextVar('read_alias', default=None)
+
+# Токены читаются из default: только что выданный токен может еще не
+# дойти до реплики.
+PRIMARY_APPS = ('authtoken',)
+
+
+class ReplicaBalancer:
+    """Взвешенный round-robin по репликам (сглаженный, как в nginx).
+
+    Реплика с весом 2 получает вдвое больше запросов, чем с весом 1,
+    и запросы к ней не идут подряд пачками.
+    """
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+        self._current = dict.fromkeys(self.weights, 0)
+        self._lock = threading.Lock()
+
+    def choose(self):
+        if not self.weights:
+            return None
+        with self._lock:
+            total = sum(self.weights.values())
+            for alias, weight in self.weights.items():
+                self._current[alias] += weight
+            alias = max(self._current, key=self._current.get)
+            self._current[alias] -= total
+            return alias
+
+
+balancer = ReplicaBalancer(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def primary_reads():
+    """Чтение из default внутри блока, даже в безопасном запросе.
+
+    Нужно для данных, которые кладутся в кэш под новой версией: реплика
+    может еще не получить запись, сменившую версию.
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReadReplicaRouter:
+    """Чтение в безопасных запросах с реплики, запись - в основную БД.
+
+    Реплику для запроса выбирает ReplicaRoutingMiddleware, вне запросов
+    и в остальных запросах все идет в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return 'default'
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Выбор базы для чтения на время запроса.
+
+    GET/HEAD/OPTIONS читают с одной реплики, выбранной балансировщиком.
+    После записи клиент на READ_YOUR_WRITES_TIMEOUT секунд читает из
+    default, чтобы видеть свои изменения несмотря на отставание реплик.
+    Клиент определяется по заголовку Authorization или cookie сессии,
+    после входа - и по выданным в ответе токену или cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def _pin_key(identity):
+        if not identity:
+            return None
+        digest = hashlib.sha256(identity.encode()).hexdigest()
+        return f'read-your-writes:{digest}'
+
+    @staticmethod
+    def _issued_identities(response):
+        """Учетные данные, с которыми клиент придет после входа."""
+        data = getattr(response, 'data', None)
+        if isinstance(data, dict) and data.get('auth_token'):
+            yield f'Token {data["auth_token"]}'
+        session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+        if session is not None and session.value:
+            yield session.value
+
+    def __call__(self, request):
+        pin_key = self._pin_key(
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+        safe = request.method in SAFE_METHODS
+        alias = None
+        if safe and not (pin_key and cache.get(pin_key)):
+            alias = balancer.choose()
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if not safe:
+            pin_keys = [pin_key] + [
+                self._pin_key(identity)
+                for identity in self._issued_identities(response)
+            ]
+            cache.set_many(
+                dict.fromkeys(filter(None, pin_keys), True),
+                settings.READ_YOUR_WRITES_TIMEOUT,
+            )
+        return response
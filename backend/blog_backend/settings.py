@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'food',
     'users',
     'rest_framework.authtoken',
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'blog_backend.db.routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,22 +60,92 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'blog_backend.wsgi.application'
 
+# Режим ASGI: ограничение одновременных чтений горячих путей и
+# остальных запросов.
+ASGI_READ_CONCURRENCY = int(os.getenv('ASGI_READ_CONCURRENCY', 16))
+ASGI_OTHER_CONCURRENCY = int(os.getenv('ASGI_OTHER_CONCURRENCY', 4))
+ASGI_READ_QUEUE_TIMEOUT = float(os.getenv('ASGI_READ_QUEUE_TIMEOUT', 10))
+ASGI_READ_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/')
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
 #         'NAME': BASE_DIR / 'db.sqlite3',
 #     },
 # }
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'blog_backend.db.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
         'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: секунды жизни, 0 - закрывать после
+        # запроса. С пулом обязательно 0: соединение возвращается в пул
+        # только при закрытии.
+        'CONN_MAX_AGE': int(
+            os.getenv('DB_CONN_MAX_AGE', 0 if DB_POOL_SIZE else 60)
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+        ),
+        # Пул соединений процесса, 0 - без пула.
+        'POOL_SIZE': DB_POOL_SIZE,
+        'POOL_TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
     }
 }
+# Реплики для чтения: host[:port[:weight]] через запятую.
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    host, port, weight = (replica.strip().split(':') + ['', ''])[:3]
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+READ_YOUR_WRITES_TIMEOUT = int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', 5))
+DATABASE_ROUTERS = ['blog_backend.db.routing.ReadReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv('CATALOGUE_CACHE_TIMEOUT', 60 * 60))
+CATALOGUE_LOCAL_CACHE_SIZE = int(os.getenv('CATALOGUE_LOCAL_CACHE_SIZE', 128))
+# Кэш ответов для анонимов: свежесть, окно stale-while-revalidate,
+# время жизни блокировки пересчета и ожидание ответа при холодном ключе.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60))
+RESPONSE_CACHE_STALE = int(os.getenv('RESPONSE_CACHE_STALE', 300))
+RESPONSE_CACHE_LOCK_TIMEOUT = int(os.getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 10))
+RESPONSE_CACHE_LOCK_WAIT = float(os.getenv('RESPONSE_CACHE_LOCK_WAIT', 2))
+KEYSET_COUNT_CACHE_TIMEOUT = int(os.getenv('KEYSET_COUNT_CACHE_TIMEOUT', 60))
+RELATIONS_CACHE_TIMEOUT = int(os.getenv('RELATIONS_CACHE_TIMEOUT', 60 * 60))
+BATCH_MAX_RECIPES = int(os.getenv('BATCH_MAX_RECIPES', 100))
+MATCH_MAX_INGREDIENTS = int(os.getenv('MATCH_MAX_INGREDIENTS', 100))
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', 5 * 60))
+FEED_CACHED_PAGES = int(os.getenv('FEED_CACHED_PAGES', 3))
+RANKING_FAVORITE_WEIGHT = float(os.getenv('RANKING_FAVORITE_WEIGHT', 1.0))
+RANKING_CART_WEIGHT = float(os.getenv('RANKING_CART_WEIGHT', 0.5))
+RANKING_TRENDING_WINDOW_DAYS = int(
+    os.getenv('RANKING_TRENDING_WINDOW_DAYS', 14)
+)
+RANKING_TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('RANKING_TRENDING_HALF_LIFE_HOURS', 48)
+)
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', 10))
+AUTOCOMPLETE_MAX_LIMIT = 50
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -97,6 +169,13 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = '/media/'
 
+RECIPE_MAX_BODY_SIZE = int(os.getenv('RECIPE_MAX_BODY_SIZE', 20 * 1024 * 1024))
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40_000_000))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_CARD_SIZE = int(os.getenv('IMAGE_CARD_SIZE', 480))
+IMAGE_CARD_QUALITY = int(os.getenv('IMAGE_CARD_QUALITY', 80))
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
@@ -1,4 +1,9 @@
+from collections import Counter
+
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 
 from food.models import (
     Cart,
@@ -8,9 +13,63 @@ from food.models import (
     RecipeIngredient,
     Tag,
 )
+from food.relations import lock_relations, relations_changed
+
+
+@admin.register(Favorite, Cart)
+class RecipeRelationAdmin(admin.ModelAdmin):
+    """Избранное и корзина: счетчики и кэши меняются как в API.
+
+    Пользователь и рецепт задаются только при создании, поэтому
+    изменение записи не затрагивает ни счетчики, ни кэши.
+    """
+
+    list_display = ('user', 'recipe', 'created_at',)
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ('user', 'recipe')
+        return ()
+
+    def _update_counters(self, rows, delta):
+        """Изменение счетчиков рецептов и кэшей пользователей из rows."""
+        counter_field = self.model.counter_field
+        for recipe_id, count in Counter(
+            recipe_id for _, recipe_id in rows
+        ).items():
+            Recipe.objects.filter(pk=recipe_id).update(
+                **{
+                    counter_field: Greatest(
+                        F(counter_field) + delta * count, 0
+                    )
+                }
+            )
+        for user_id in {user_id for user_id, _ in rows}:
+            relations_changed(user_id, self.model)
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if not change:
+                lock_relations(obj.user_id)
+            super().save_model(request, obj, form, change)
+            if not change:
+                self._update_counters([(obj.user_id, obj.recipe_id)], 1)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            lock_relations(obj.user_id)
+            super().delete_model(request, obj)
+            self._update_counters([(obj.user_id, obj.recipe_id)], -1)
 
-admin.site.register(Favorite)
-admin.site.register(Cart)
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for user_id in sorted(
+                set(queryset.values_list('user_id', flat=True))
+            ):
+                lock_relations(user_id)
+            rows = list(queryset.values_list('user_id', 'recipe_id'))
+            super().delete_queryset(request, queryset)
+            self._update_counters(rows, -1)
 
 
 @admin.register(Ingredient)
@@ -34,6 +93,12 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = [
         RecipeIngredientsInline,
     ]
-    list_display = ('name', 'author',)
+    list_display = ('name', 'author', 'favorites_count',)
+    readonly_fields = (
+        'favorites_count',
+        'carts_count',
+        'image_card',
+        'image_hash',
+    )
     list_filter = ('author', 'name', 'tags',)
     search_fields = ('author', 'name', 'tags',)
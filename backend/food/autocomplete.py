@@ -0,0 +1,117 @@
+import threading
+from bisect import bisect_left
+
+from blog_backend.db.routing import primary_reads
+from food.cache import get_version
+from food.models import Ingredient
+
+
+def within_distance(first, second, max_distance):
+    """Проверка, что между строками не больше max_distance опечаток.
+
+    Опечатка - вставка, удаление, замена или перестановка соседних
+    символов (расстояние Дамерау-Левенштейна).
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return False
+    before, previous = None, list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        current = [i]
+        for j, second_char in enumerate(second, start=1):
+            distance = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (first_char != second_char),
+            )
+            if (
+                i > 1
+                and j > 1
+                and first_char == second[j - 2]
+                and first[i - 2] == second_char
+            ):
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > max_distance:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= max_distance
+
+
+class IngredientIndex:
+    """Отсортированный по названию список ингредиентов в памяти процесса.
+
+    Загружается при первом обращении и перечитывается, когда меняется
+    версия кэша справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+
+    def _refresh(self):
+        version = get_version('ingredients')
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            with primary_reads():
+                items = sorted(
+                    Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'
+                    ),
+                    key=lambda item: (item['name'].lower(), item['id']),
+                )
+            self._keys = [item['name'].lower() for item in items]
+            self._items = items
+            self._version = version
+
+    def search(self, query, limit):
+        """Поиск ингредиентов по началу названия.
+
+        Сначала идут совпадения по префиксу, затем по подстроке, затем
+        названия, начало которых отличается от запроса опечаткой.
+        """
+        self._refresh()
+        keys, items = self._keys, self._items
+        query = query.strip().lower()
+        if not query:
+            return items[:limit]
+
+        found = []
+        start = bisect_left(keys, query)
+        for position in range(start, len(keys)):
+            if len(found) == limit or not keys[position].startswith(query):
+                break
+            found.append(position)
+
+        seen = set(found)
+        substring = sorted(
+            (keys[position].find(query), keys[position], position)
+            for position in range(len(keys))
+            if position not in seen and query in keys[position]
+        )
+        found.extend(position for *_, position in substring)
+        seen.update(found)
+
+        if len(found) < limit and len(query) >= 3:
+            max_distance = 1 if len(query) < 6 else 2
+            query_chars = set(query)
+            close_prefixes = {
+                prefix
+                for prefix in {key[: len(query)] for key in keys}
+                if len(query_chars ^ set(prefix)) <= 2 * max_distance
+                and within_distance(query, prefix, max_distance)
+            }
+            found.extend(
+                position
+                for position in range(len(keys))
+                if position not in seen
+                and keys[position][: len(query)] in close_prefixes
+            )
+        return [items[position] for position in found[:limit]]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,268 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from blog_backend.db.routing import primary_reads
+
+
+def get_version(namespace):
+    """Текущая версия пространства кэша.
+
+    Версия - время последнего изменения данных (timestamp), поэтому
+    она же служит значением Last-Modified.
+    """
+    key = f'version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(namespaces):
+    """Версии нескольких пространств одним обращением к кэшу.
+
+    Для пространств без версии возвращается 0, такие версии не
+    сохраняются.
+    """
+    versions = cache.get_many([f'version:{ns}' for ns in namespaces])
+    return [versions.get(f'version:{ns}', 0) for ns in namespaces]
+
+
+def bump_version(namespace):
+    """Инвалидация всех записей пространства сменой версии."""
+    cache.set(f'version:{namespace}', time.time(), None)
+
+
+def bump_version_on_commit(namespace):
+    """Смена версии после коммита текущей транзакции."""
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+local_cache = LRUCache(settings.CATALOGUE_LOCAL_CACHE_SIZE)
+
+
+def normalized_query(request):
+    """Строка запроса с отсортированными параметрами."""
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(request.query_params)
+        for value in sorted(request.query_params.getlist(key))
+    )
+
+
+class CatalogueCacheMixin:
+    """Кэширование ответов справочных viewset-ов.
+
+    Сериализованные данные хранятся в кэше Django под ключом с версией
+    пространства cache_namespace, перед ним стоит LRU-кэш процесса.
+    Версия меняется сигналами при изменении моделей справочника.
+    """
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        version = get_version(self.cache_namespace)
+        key = (
+            f'catalogue:{self.cache_namespace}:{version}:'
+            f'{request.path}?{normalized_query(request)}'
+        )
+        etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(version)
+        )
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        data = local_cache.get(key)
+        if data is None:
+            data = cache.get(key)
+        if data is None:
+            with primary_reads():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, settings.CATALOGUE_CACHE_TIMEOUT)
+        local_cache.set(key, data)
+
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version)
+        return response
+
+
+class AnonymousCacheMixin:
+    """Кэширование целых ответов list для анонимных пользователей.
+
+    Ответ для анонимов зависит только от строки запроса, поэтому он
+    хранится под ключом из нормализованного запроса. Запись свежая, пока
+    совпадает поколение anonymous_cache_namespace и не истек
+    RESPONSE_CACHE_TIMEOUT. Еще RESPONSE_CACHE_STALE секунд устаревшая
+    запись отдается всем, кроме одного запроса, который под блокировкой
+    пересчитывает ответ; при холодном ключе остальные ждут его результат.
+    """
+
+    anonymous_cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+        generation = get_version(self.anonymous_cache_namespace)
+        key = (
+            f'anonymous:{self.anonymous_cache_namespace}:'
+            f'{request.get_host()}{request.path}?{normalized_query(request)}'
+        )
+        entry = cache.get(key)
+        age = time.time() - entry['created'] if entry else None
+        if entry and entry['generation'] == generation and (
+            age < settings.RESPONSE_CACHE_TIMEOUT
+        ):
+            return Response(entry['data'])
+
+        lock_key = f'{key}:lock'
+        locked = cache.add(
+            lock_key, True, settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        )
+        if not locked:
+            if entry is None:
+                entry = self._wait_for(key)
+            elif age >= (
+                settings.RESPONSE_CACHE_TIMEOUT + settings.RESPONSE_CACHE_STALE
+            ):
+                entry = None
+            if entry is not None:
+                return Response(entry['data'])
+
+        try:
+            with primary_reads():
+                response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key,
+                    {
+                        'data': response.data,
+                        'generation': generation,
+                        'created': time.time(),
+                    },
+                    settings.RESPONSE_CACHE_TIMEOUT
+                    + settings.RESPONSE_CACHE_STALE,
+                )
+            return response
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    @staticmethod
+    def _wait_for(key):
+        """Ожидание ответа, который считает запрос с блокировкой."""
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve без сериализации.
+
+    Viewset возвращает из get_list_fingerprint/get_object_fingerprint
+    пару (части отпечатка, время изменения) - дешевые версии кэша или
+    узкий запрос к БД. Если отпечаток совпал с If-None-Match или данные
+    не менялись после If-Modified-Since, отдается 304 и сериализаторы не
+    запускаются. None вместо пары - ответ отдается без проверки.
+    """
+
+    def get_list_fingerprint(self, request):
+        return None
+
+    def get_object_fingerprint(self, request, *args, **kwargs):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(
+            self.get_list_fingerprint(request),
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(
+            self.get_object_fingerprint(request, *args, **kwargs),
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _conditional_response(fingerprint, handler, request, *args, **kwargs):
+        if fingerprint is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = fingerprint
+        key = repr(
+            (request.user.id, request.path, normalized_query(request), parts)
+        )
+        etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            # Пока реплики могут отставать от смены версий, тело читается
+            # из default, иначе старые данные получат новый ETag.
+            if time.time() - last_modified < settings.READ_YOUR_WRITES_TIMEOUT:
+                with primary_reads():
+                    response = handler(request, *args, **kwargs)
+            else:
+                response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
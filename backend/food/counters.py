@@ -0,0 +1,56 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from food.cache import bump_version_on_commit
+from food.models import Cart, Favorite, Recipe
+from users.models import Follow, User
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю запись."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': (Favorite, 'recipe'),
+        'carts_count': (Cart, 'recipe'),
+    },
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follow, 'author'),
+    },
+}
+
+
+def recount_counters():
+    """Пересчет денормализованных счетчиков.
+
+    Возвращает число записей каждой модели, у которых счетчики
+    расходились с фактическими данными.
+    """
+    drifted = {}
+    for model, counters in COUNTERS.items():
+        actual = {
+            field: count_subquery(*source)
+            for field, source in counters.items()
+        }
+        drifted[model.__name__] = (
+            model.objects.annotate(
+                **{f'actual_{field}': value for field, value in actual.items()}
+            )
+            .exclude(**{field: F(f'actual_{field}') for field in counters})
+            .count()
+        )
+        model.objects.update(**actual)
+    bump_version_on_commit('recipe-counters')
+    return drifted
@@ -0,0 +1,60 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from blog_backend.db.routing import primary_reads
+from food.cache import get_version, get_versions, normalized_query
+from food.pagination import KeysetPagination
+from users.models import Follow
+
+
+def follows_namespace(user_id):
+    return f'feed:follows:{user_id}'
+
+
+def user_namespace(user_id):
+    return f'feed:user:{user_id}'
+
+
+def author_namespace(author_id):
+    return f'feed:author:{author_id}'
+
+
+def followed_authors(user):
+    """Авторы из подписок пользователя, закэшированные до их изменения."""
+    version = get_version(follows_namespace(user.id))
+    key = f'feed:authors:{user.id}:{version}'
+    authors = cache.get(key)
+    if authors is None:
+        with primary_reads():
+            authors = sorted(
+                Follow.objects.filter(user=user).values_list(
+                    'author_id', flat=True
+                )
+            )
+        cache.set(key, authors, settings.FEED_CACHE_TIMEOUT)
+    return version, authors
+
+
+def feed_cache_key(request):
+    """Ключ кэша страницы ленты или None, если страница не кэшируется.
+
+    Кэшируются первые FEED_CACHED_PAGES страниц. Ключ собирается из
+    версий подписок и избранного/корзины пользователя и поколений
+    рецептов каждого автора из подписок (fan-out-on-read): публикация
+    автора меняет ключи только его подписчиков, без обхода их лент.
+    """
+    depth = KeysetPagination.get_depth(request)
+    if depth is None or depth >= settings.FEED_CACHED_PAGES:
+        return None
+    user = request.user
+    follows_version, authors = followed_authors(user)
+    versions = get_versions(
+        [user_namespace(user.id)]
+        + [author_namespace(author) for author in authors]
+    )
+    fingerprint = hashlib.md5(
+        repr((follows_version, versions)).encode()
+    ).hexdigest()
+    return f'feed:{user.id}:{fingerprint}:{normalized_query(request)}'
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import uuid
+from io import BytesIO
+
+import filetype
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+# Кратно 4, чтобы каждый кусок base64 декодировался отдельно.
+CHUNK_SIZE = 256 * 1024
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """Временный файл фото, закрываемый вместе с объектом.
+
+    Хранилище перемещает временный файл в MEDIA_ROOT, и без явного
+    close() tempfile пытается удалить уже перемещенный файл.
+    """
+
+    def __del__(self):
+        self.close()
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Base64ImageField с потоковым декодированием во временный файл.
+
+    Размер проверяется по длине base64-строки до декодирования, формат и
+    число пикселей - по заголовку из первого куска. Остальные куски
+    дописываются во временный файл на диске, поэтому декодированная
+    копия фото целиком в памяти не держится.
+    """
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if ';base64,' in base64_data:
+            base64_data = base64_data.split(';base64,', 1)[1]
+        if any(char.isspace() for char in base64_data[:CHUNK_SIZE]):
+            base64_data = ''.join(base64_data.split())
+
+        if len(base64_data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Размер фото больше '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+            )
+
+        head = self._decode(base64_data[:CHUNK_SIZE])
+        extension = self._validate_header(head)
+        upload = DecodedImageFile(
+            name=f'{uuid.uuid4()}.{extension}',
+            content_type=f'image/{extension}',
+            size=0,
+            charset=None,
+        )
+        upload.write(head)
+        for start in range(CHUNK_SIZE, len(base64_data), CHUNK_SIZE):
+            upload.write(
+                self._decode(base64_data[start:start + CHUNK_SIZE])
+            )
+        upload.size = upload.tell()
+        upload.seek(0)
+        return serializers.ImageField.to_internal_value(self, upload)
+
+    def _decode(self, chunk):
+        try:
+            return base64.b64decode(chunk, validate=True)
+        except (binascii.Error, ValueError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+
+    def _validate_header(self, head):
+        """Проверка формата и размеров фото по первому куску."""
+        extension = filetype.guess_extension(head)
+        if extension == 'jpeg':
+            extension = 'jpg'
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        try:
+            with Image.open(BytesIO(head)) as image:
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise serializers.ValidationError(
+                f'Фото больше {settings.RECIPE_IMAGE_MAX_PIXELS} пикселей.'
+            )
+        return extension
@@ -1,7 +1,18 @@
+from django.db.models import Exists, FloatField, OuterRef, Value
+from django.db.models.functions import Coalesce
 from django_filters import rest_framework as django_filters
 from rest_framework.filters import SearchFilter
 
-from food.models import Cart, Favorite, Recipe, Tag
+from food.models import Recipe, Tag
+from food.relations import user_relations
+from food.search import search_recipes
+
+ORDERINGS = {
+    'new': ('-pub_date', '-id'),
+    'popular': ('-popularity', '-pub_date', '-id'),
+    'trending': ('-trending', '-pub_date', '-id'),
+}
+RANKING_SCORES = ('popularity', 'trending')
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -9,6 +20,7 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='filter_tags',
     )
 
     is_favorited = django_filters.BooleanFilter(
@@ -21,25 +33,73 @@ class RecipeFilter(django_filters.FilterSet):
         label='Cart Recipe',
     )
 
+    search = django_filters.CharFilter(
+        method='filter_search',
+        label='Search',
+    )
+
+    ordering = django_filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='filter_ordering',
+        label='Ordering',
+    )
+
     class Meta:
         model = Recipe
         fields = ['tags', 'is_favorited', 'author', 'is_in_shopping_cart']
 
-    def filter_shopping_cart(self, queryset, name, value):
-        user = self.request.user
-        if value and not user.is_anonymous:
-            cart_recipes = Cart.objects.filter(user=self.request.user).values(
-                'recipe'
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, результаты по убыванию релевантности.
+
+        Явно заданный параметр ordering сортировку переопределяет.
+        """
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по дате, популярности или тренду из RecipeRanking.
+
+        Рецепты без строки рейтинга получают нулевой балл и идут в конце,
+        курсор keyset-пагинации не упирается в отсутствующую связь.
+        """
+        score = ORDERINGS[value][0].lstrip('-')
+        if score in RANKING_SCORES:
+            queryset = queryset.annotate(
+                **{
+                    score: Coalesce(
+                        f'ranking__{score}',
+                        Value(0.0),
+                        output_field=FloatField(),
+                    )
+                }
+            )
+        return queryset.order_by(*ORDERINGS[value])
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов.
+
+        Фильтр через EXISTS не размножает строки рецепта при нескольких
+        тегах, поэтому DISTINCT не нужен.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__in=value
+                )
             )
-            return queryset.filter(id__in=cart_recipes)
+        )
+
+    def filter_shopping_cart(self, queryset, name, value):
+        if value:
+            return queryset.filter(id__in=user_relations(self.request).cart)
         return queryset
 
     def filter_favorited(self, queryset, name, value):
         if value:
-            cart_recipes = Favorite.objects.filter(
-                user=self.request.user
-            ).values('recipe')
-            return queryset.filter(id__in=cart_recipes)
+            return queryset.filter(
+                id__in=user_relations(self.request).favorites
+            )
         return queryset
 
 
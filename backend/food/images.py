@@ -0,0 +1,82 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from food.cache import bump_version
+from food.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+CARD_DIRECTORY = 'food/images/cards/'
+
+executor = (
+    ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS,
+        thread_name_prefix='recipe-images',
+    )
+    if settings.IMAGE_WORKERS
+    else None
+)
+
+
+def make_card(content):
+    """Уменьшенная копия фото в WebP без метаданных."""
+    with Image.open(BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((settings.IMAGE_CARD_SIZE, settings.IMAGE_CARD_SIZE))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode else 'RGB')
+        output = BytesIO()
+        image.save(output, 'WEBP', quality=settings.IMAGE_CARD_QUALITY)
+    return output.getvalue()
+
+
+def process_recipe_image(recipe_id):
+    """Создание карточки фото рецепта.
+
+    Карточка сохраняется под именем из хэша содержимого оригинала,
+    поэтому одинаковые фото обрабатываются и хранятся один раз.
+    """
+    try:
+        recipe = Recipe.objects.only('image').get(pk=recipe_id)
+        with recipe.image.open('rb') as image_file:
+            content = image_file.read()
+        image_hash = hashlib.sha256(content).hexdigest()
+        card_name = f'{CARD_DIRECTORY}{image_hash}.webp'
+        if not default_storage.exists(card_name):
+            card_name = default_storage.save(
+                card_name, ContentFile(make_card(content))
+            )
+        Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+            image_card=card_name,
+            image_hash=image_hash,
+            updated_at=timezone.now(),
+        )
+        bump_version('recipes')
+    except Exception:
+        logger.exception('Не удалось обработать фото рецепта %s', recipe_id)
+
+
+def _process_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(recipe):
+    """Обработка фото после коммита транзакции в пуле потоков."""
+    if executor is None:
+        transaction.on_commit(lambda: process_recipe_image(recipe.pk))
+        return
+    transaction.on_commit(
+        lambda: executor.submit(_process_in_worker, recipe.pk)
+    )
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=20',
+    '/api/tags/',
+    '/api/ingredients/?name=%D0%B0',
+)
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def rss_kb(pid):
+    """Резидентная память процесса и всех его потомков (Linux /proc)."""
+    total = 0
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1])
+    with open(f'/proc/{pid}/task/{pid}/children') as children:
+        total += sum(rss_kb(child) for child in children.read().split())
+    return total
+
+
+class Command(BaseCommand):
+    """Нагрузочный тест чтения рецептов, тегов и ингредиентов.
+
+    Запросы идут по HTTP к уже запущенному серверу, поэтому одной
+    командой сравниваются режимы WSGI (gunicorn) и ASGI (uvicorn).
+    Печатает запросы в секунду, задержки p50/p99 и, если передан
+    --pid, занятую сервером память. Порядок сравнения описан в
+    command_benchmark_reads.md.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Число одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность теста в секундах.',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Путь для запросов, можно указать несколько раз.',
+        )
+        parser.add_argument(
+            '--token', help='Токен пользователя для авторизованных запросов.'
+        )
+        parser.add_argument(
+            '--pid',
+            type=int,
+            help='PID мастер-процесса сервера для замера памяти.',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or PATHS
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        try:
+            urlopen(Request(options['url'] + paths[0], headers=headers))
+        except URLError as err:
+            raise CommandError(f'Сервер недоступен: {err}')
+
+        latencies, errors = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def client(number):
+            position = number
+            while time.monotonic() < deadline:
+                url = options['url'] + paths[position % len(paths)]
+                position += 1
+                started = time.monotonic()
+                try:
+                    with urlopen(Request(url, headers=headers)) as response:
+                        response.read()
+                except (URLError, OSError) as err:
+                    with lock:
+                        errors.append(err)
+                    continue
+                with lock:
+                    latencies.append(time.monotonic() - started)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(client, range(options['concurrency'])))
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        self.stdout.write(
+            f'{len(latencies)} запросов за {elapsed:.1f} с: '
+            f'{len(latencies) / elapsed:.1f} запросов/с, '
+            f'p50 {percentile(latencies, 0.5) * 1000:.1f} мс, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f} мс, '
+            f'ошибок {len(errors)}'
+        )
+        if options['pid']:
+            self.stdout.write(
+                f'Память сервера: {rss_kb(options["pid"]) / 1024:.0f} МБ'
+            )
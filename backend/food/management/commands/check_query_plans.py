@@ -0,0 +1,215 @@
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from food.filter import RecipeFilter
+from food.models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+)
+from food.views import RecipeViewSet
+from users.models import Follow, User
+
+# Индекс, который должен вести план первой страницы. Лента и теги идут
+# по recipe_pub_date_id_idx в порядке выдачи и останавливаются на LIMIT,
+# теги проверяются по уникальному индексу (recipe_id, tag_id) связи.
+# Автор - по recipe_author_pub_date_idx. Избранное и корзина - короткий
+# список id из кэша, для него план зависит от размера таблицы.
+EXPECTED_INDEXES = {
+    'feed': 'recipe_pub_date_id_idx',
+    'author': 'recipe_author_pub_date_idx',
+    'tag': 'recipe_pub_date_id_idx',
+    'tags': 'recipe_pub_date_id_idx',
+    'author+tags': 'recipe_author_pub_date_idx',
+}
+
+
+def filter_combinations(author, tags):
+    return {
+        'feed': {},
+        'author': {'author': author.id},
+        'tag': {'tags': [tags[0].slug]},
+        'tags': {'tags': [tag.slug for tag in tags[:3]]},
+        'favorited': {'is_favorited': 1},
+        'cart': {'is_in_shopping_cart': 1},
+        'author+tags': {
+            'author': author.id,
+            'tags': [tag.slug for tag in tags[:2]],
+        },
+        'favorited+tag': {'is_favorited': 1, 'tags': [tags[1].slug]},
+    }
+
+
+def pick_subjects():
+    """Пользователь с избранным, автор с рецептами и три тега."""
+    user = (
+        User.objects.filter(favorits__isnull=False).first()
+        or User.objects.first()
+    )
+    author = User.objects.filter(recipes__isnull=False).first()
+    tags = list(Tag.objects.all()[:3])
+    if user is None or author is None or len(tags) < 3:
+        return None
+    return user, author, tags
+
+
+def list_queries(params, user):
+    """Ответ RecipeViewSet.list и число выполненных им запросов."""
+    request = APIRequestFactory().get('/api/recipes/', params)
+    force_authenticate(request, user=user)
+    with CaptureQueriesContext(connection) as queries:
+        response = RecipeViewSet.as_view({'get': 'list'})(request)
+    return response, len(queries)
+
+
+def explain(params, user):
+    """План запроса первой страницы RecipeFilter для параметров списка."""
+    request = APIRequestFactory().get('/api/recipes/', params)
+    request.user = user
+    queryset = RecipeFilter(
+        request.GET, Recipe.objects.for_read(user), request=request
+    ).qs
+    return queryset[: settings.REST_FRAMEWORK['PAGE_SIZE']].explain()
+
+
+def missing_index(name, plan):
+    """Ожидаемый индекс комбинации, если план его не использует."""
+    index = EXPECTED_INDEXES.get(name)
+    if index is None or f' {index} ' in plan:
+        return None
+    return index
+
+
+def seed(recipes_count):
+    """Генерация пользователей, рецептов и связей пачками."""
+    User.objects.bulk_create(
+        User(username=f'seed_{i}', email=f'seed_{i}@example.com')
+        for i in range(max(recipes_count // 50, 10))
+    )
+    users = list(User.objects.filter(username__startswith='seed_'))
+    Tag.objects.bulk_create(
+        Tag(name=f'seed_{i}', color=f'#{i:06d}', slug=f'seed_{i}')
+        for i in range(10)
+    )
+    tags = list(Tag.objects.filter(slug__startswith='seed_'))
+    if not Ingredient.objects.exists():
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'seed_{i}', measurement_unit='г')
+            for i in range(500)
+        )
+    ingredients = list(Ingredient.objects.all()[:500])
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=random.choice(users),
+            name=f'seed_{i}',
+            image='food/images/seed.png',
+            text='seed',
+        )
+        for i in range(recipes_count)
+    )
+    recipes = list(Recipe.objects.filter(name__startswith='seed_'))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes
+        for tag in random.sample(tags, 3)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for recipe in recipes
+        for ingredient in random.sample(ingredients, 5)
+    )
+    for model in (Favorite, Cart):
+        model.objects.bulk_create(
+            (
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in random.sample(recipes, min(len(recipes), 20))
+            ),
+            ignore_conflicts=True,
+        )
+    Follow.objects.bulk_create(
+        (
+            Follow(user=user, author=author)
+            for user in users
+            for author in random.sample(users, 5)
+            if user != author
+        ),
+        ignore_conflicts=True,
+    )
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """Проверка планов запросов и числа запросов для фильтров рецептов.
+
+    Каждая комбинация RecipeFilter прогоняется через EXPLAIN и через
+    RecipeViewSet.list. Команда падает, если на PostgreSQL план первой
+    страницы не использует индекс из EXPECTED_INDEXES или страница
+    делает больше запросов, чем --max-queries. С --seed данные
+    генерируются внутри транзакции, которая откатывается после проверки.
+    Те же проверки выполняют тесты food.tests.QueryPlanTests.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Сгенерировать столько рецептов перед проверкой.',
+        )
+        parser.add_argument(
+            '--max-queries',
+            type=int,
+            default=6,
+            help='Допустимое число запросов на страницу списка.',
+        )
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    seed(options['seed'])
+                failures = self._check(options['max_queries'])
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write('Планы запросов в порядке')
+
+    def _check(self, max_queries):
+        subjects = pick_subjects()
+        if subjects is None:
+            raise CommandError('Нет данных, запустите команду с --seed.')
+        user, author, tags = subjects
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        failures = []
+        for name, params in filter_combinations(author, tags).items():
+            response, count = list_queries(params, user)
+            if response.status_code != 200:
+                failures.append(f'{name}: статус {response.status_code}')
+            if count > max_queries:
+                failures.append(f'{name}: {count} запросов')
+            plan = explain(params, user)
+            self.stdout.write(f'--- {name}\n{plan}')
+            index = None
+            if connection.vendor == 'postgresql':
+                index = missing_index(name, plan)
+            if index is not None:
+                failures.append(f'{name}: не используется {index}')
+        return failures
@@ -1,44 +1,173 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
 from django.core.management.base import BaseCommand
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 
+from food.cache import bump_version
 from food.models import Ingredient, Tag
 
 FILES = {
-    Ingredient: 'ingredients.csv',
-    Tag: 'tags.csv',
+    Ingredient: {
+        'csv': 'ingredients.csv',
+        'json': 'ingredients.json',
+        'key': ('name', 'measurement_unit'),
+        'cache_namespace': 'ingredients',
+    },
+    Tag: {
+        'csv': 'tags.csv',
+        'key': ('slug',),
+        'cache_namespace': 'tags',
+    },
 }
 
 
+def read_csv(path):
+    with open(file=path, mode='r', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def read_json(path):
+    with open(file=path, mode='r', encoding='utf-8') as f:
+        yield from json.load(f)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
 class Command(BaseCommand):
-    """Загрузка данных ингредиентов и тегов."""
+    """Загрузка данных ингредиентов и тегов.
 
-    def handle(self, *args, **options):
-        parent_directory_backend = os.getcwd()
-        for models, files in FILES.items():
-            path_csv_files = os.path.join(
-                parent_directory_backend,
+    Строки читаются потоком и записываются пачками: на каждую пачку
+    один SELECT существующих записей, bulk_create для новых и
+    bulk_update для изменившихся в одной транзакции. Повторный запуск
+    ничего не меняет.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            default='csv',
+            dest='source_format',
+            help='Формат исходных файлов, если он доступен для модели.',
+        )
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(
+                os.getcwd(),
                 # 'backend',  # if local dev / no in containers - discommend
                 'data',
-                files,
+            ),
+            help='Каталог с файлами данных.',
+        )
+
+    def handle(self, *args, **options):
+        for model, config in FILES.items():
+            source_format = options['source_format']
+            if source_format not in config:
+                source_format = 'csv'
+            path = os.path.join(options['data_dir'], config[source_format])
+            stats = {'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+
+            started = time.monotonic()
+            rows = READERS[source_format](path)
+            for batch in batches(rows, options['batch_size']):
+                try:
+                    self._import_batch(model, config['key'], batch, stats)
+                except IntegrityError as err:
+                    stats['failed'] += len(batch)
+                    self.stderr.write(
+                        f'{err} - данные в '
+                        f'таблице {model.__name__} '
+                        f'или уже существуют, или не валидные',
+                    )
+            elapsed = time.monotonic() - started
+            bump_version(config['cache_namespace'])
+
+            total = sum(stats.values())
+            self.stdout.write(
+                f'{model.__name__}: {total} строк за {elapsed:.2f} с '
+                f'({total / elapsed if elapsed else total:.0f} строк/с), '
+                f'добавлено {stats["inserted"]}, '
+                f'обновлено {stats["updated"]}, '
+                f'пропущено {stats["skipped"]}, '
+                f'ошибок {stats["failed"]}'
+            )
+        self.stdout.write('Работа завершена')
+
+    @staticmethod
+    def _import_batch(model, key_fields, batch, stats):
+        """Запись одной пачки строк в таблицу модели."""
+        value_fields = [
+            field.name
+            for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in key_fields
+        ]
+        rows = {}
+        for row in batch:
+            key = tuple(row[field] for field in key_fields)
+            if key in rows:
+                stats['skipped'] += 1
+            rows[key] = row
+
+        first_key = key_fields[0]
+        with transaction.atomic():
+            existing = {
+                tuple(getattr(obj, field) for field in key_fields): obj
+                for obj in model.objects.filter(
+                    **{f'{first_key}__in': {key[0] for key in rows}}
+                )
+            }
+            to_create, to_update = [], []
+            for key, row in rows.items():
+                obj = existing.get(key)
+                if obj is None:
+                    to_create.append(model(**row))
+                    continue
+                changed = [
+                    field
+                    for field in value_fields
+                    if field in row and getattr(obj, field) != row[field]
+                ]
+                if not changed:
+                    stats['skipped'] += 1
+                    continue
+                for field in changed:
+                    setattr(obj, field, row[field])
+                to_update.append(obj)
+
+            model.objects.bulk_create(to_create, ignore_conflicts=True)
+            if to_update:
+                model.objects.bulk_update(to_update, value_fields)
+            # Строки, отброшенные конфликтом с параллельной загрузкой,
+            # не считаются добавленными: число берется из БД.
+            inserted = len(
+                set(
+                    model.objects.filter(
+                        **{f'{first_key}__in': {key[0] for key in rows}}
+                    ).values_list(*key_fields)
+                )
+                - set(existing)
             )
-            with open(file=path_csv_files, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        model_write, create = models.objects.get_or_create(
-                            **row,
-                        )
-                        if not create:
-                            model_write = models.objects.update(**row)
-                            print('данные обновлены')
-                        model_write.save()
-                    except IntegrityError as err:
-                        print(
-                            f'{err} - данные в '
-                            f'таблице {models.__name__} '
-                            f'или уже существуют, или не валидные',
-                        )
-        print('Работа завершена')
+        stats['inserted'] += inserted
+        stats['skipped'] += len(to_create) - inserted
+        stats['updated'] += len(to_update)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from food.images import process_recipe_image
+from food.models import Recipe
+
+
+class Command(BaseCommand):
+    """Создание карточек фото для рецептов, у которых их еще нет."""
+
+    def handle(self, *args, **options):
+        recipe_ids = Recipe.objects.filter(image_hash='').values_list(
+            'id', flat=True
+        )
+        count = 0
+        for recipe_id in recipe_ids.iterator():
+            process_recipe_image(recipe_id)
+            count += 1
+        self.stdout.write(f'Обработано фото: {count}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from food.counters import recount_counters
+
+
+class Command(BaseCommand):
+    """Пересчет счетчиков избранного, корзин, рецептов и подписчиков."""
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = recount_counters()
+        for model, count in drifted.items():
+            self.stdout.write(f'{model}: исправлено записей {count}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from food.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    """Пересчет рейтингов рецептов для сортировок popular и trending.
+
+    Запускается периодически, например из cron раз в несколько минут.
+    """
+
+    def handle(self, *args, **options):
+        stats = refresh_rankings()
+        self.stdout.write(
+            f'Новых строк: {stats["created"]}, '
+            f'обновлено популярность: {stats["popularity"]}, '
+            f'тренд: {stats["trending"]}'
+        )
@@ -0,0 +1,72 @@
+import threading
+from array import array
+from collections import Counter
+
+from blog_backend.db.routing import primary_reads
+from food.cache import get_version
+from food.models import RecipeIngredient
+
+CACHE_NAMESPACE = 'recipe-ingredients'
+
+
+class RecipeMatchIndex:
+    """Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится компактный массив id рецептов, для
+    каждого рецепта - число его ингредиентов. Индекс строится одним
+    запросом к RecipeIngredient при первом обращении и перестраивается,
+    когда меняется версия кэша после записи рецептов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._sizes = {}
+
+    def _refresh(self):
+        version = get_version(CACHE_NAMESPACE)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            postings, sizes = {}, Counter()
+            rows = RecipeIngredient.objects.values_list(
+                'ingredient_id', 'recipe_id'
+            ).order_by()
+            with primary_reads():
+                for ingredient_id, recipe_id in rows.iterator():
+                    if ingredient_id not in postings:
+                        postings[ingredient_id] = array('L')
+                    postings[ingredient_id].append(recipe_id)
+                    sizes[recipe_id] += 1
+            self._postings, self._sizes = postings, dict(sizes)
+            self._version = version
+
+    def match(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Возвращает кортежи (recipe_id, совпало, не хватает) по
+        возрастанию числа недостающих ингредиентов, затем по убыванию
+        доли совпавших; при равенстве новые рецепты идут первыми.
+        """
+        self._refresh()
+        postings, sizes = self._postings, self._sizes
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        return sorted(
+            (
+                (recipe_id, count, sizes[recipe_id] - count)
+                for recipe_id, count in matched.items()
+            ),
+            key=lambda item: (
+                item[2],
+                -item[1] / sizes[item[0]],
+                -item[0],
+            ),
+        )
+
+
+recipe_match_index = RecipeMatchIndex()
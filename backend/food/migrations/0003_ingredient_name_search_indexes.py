@@ -0,0 +1,36 @@
+from django.db import migrations
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS food_ingredient_name_prefix_idx '
+    'ON food_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS food_ingredient_name_trgm_idx '
+    'ON food_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for sql in INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS food_ingredient_name_trgm_idx')
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS food_ingredient_name_prefix_idx'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0002_alter_recipe_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
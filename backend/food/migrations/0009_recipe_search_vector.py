@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-18 08:29
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+FILL_SEARCH_VECTOR = '''
+UPDATE food_recipe AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, COALESCE(recipe.name, '')), 'A')
+    || setweight(to_tsvector(%(config)s, COALESCE(recipe.text, '')), 'B')
+    || setweight(to_tsvector(%(config)s, COALESCE((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM food_recipeingredient AS item
+        JOIN food_ingredient AS ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), '')), 'C')
+'''
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        FILL_SEARCH_VECTOR, params={'config': settings.SEARCH_CONFIG}
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+        'ON food_recipe USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0008_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
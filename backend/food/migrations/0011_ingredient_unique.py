@@ -0,0 +1,36 @@
+# Generated by Django 3.2.3 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('food', 'Ingredient')
+    RecipeIngredient = apps.get_model('food', 'RecipeIngredient')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep'])
+        RecipeIngredient.objects.filter(ingredient__in=extra).update(
+            ingredient_id=group['keep']
+        )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0010_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('food', '0011_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_recipe_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='favorite',
+            name='favorite_recipe_user_idx',
+        ),
+        migrations.RunSQL(
+            'DROP INDEX food_recipe_tags_tag_recipe_idx',
+            'CREATE INDEX food_recipe_tags_tag_recipe_idx '
+            'ON food_recipe_tags (tag_id, recipe_id)',
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+    ]
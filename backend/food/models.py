@@ -1,6 +1,9 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Value
 
-from users.models import User
+from blog_backend.db.models import CounterFieldsMixin
+from users.models import Follow, User
 
 
 class Tag(models.Model):
@@ -28,6 +31,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Игредиент'
         verbose_name_plural = 'Игредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -57,12 +66,48 @@ class RecipeIngredient(models.Model):
         verbose_name_plural = 'Количество ингредиентов'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def for_read(self, user):
+        """Queryset для списка и детального просмотра рецептов.
+
+        Автор подтягивается JOIN-ом, теги и ингредиенты - одним
+        prefetch-запросом на страницу, подписка на автора - подзапросом.
+        Поисковый вектор в ответ не попадает и не читается. Избранное и
+        корзина пользователя берутся из кэша, см. food.relations.
+        """
+        queryset = (
+            self.select_related('author')
+            .defer('search_vector')
+            .prefetch_related(
+                'tags',
+                models.Prefetch(
+                    'recipeingredient_set',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    ),
+                ),
+            )
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                author_is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            author_is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            )
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
+    # Отдельный индекс по автору не нужен: recipe_author_pub_date_idx
+    # начинается с author_id и обслуживает и фильтр, и каскадное удаление.
     author = models.ForeignKey(
         User,
         verbose_name='Автор рецепта',
         on_delete=models.CASCADE,
         related_name='recipes',
+        db_index=False,
     )
     name = models.CharField(
         'Название рецепта',
@@ -72,6 +117,16 @@ class Recipe(models.Model):
         'Фото',
         upload_to='food/images/',
     )
+    image_card = models.ImageField(
+        'Фото для карточки',
+        upload_to='food/images/cards/',
+        blank=True,
+    )
+    image_hash = models.CharField(
+        'Хэш фото',
+        max_length=64,
+        blank=True,
+    )
     text = models.TextField(
         'Описание',
         max_length=1500,
@@ -94,11 +149,37 @@ class Recipe(models.Model):
         default=1,
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+    )
+    carts_count = models.PositiveIntegerField(
+        'Добавлений в корзину',
+        default=0,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count', 'carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Recipe name: {self.name}. Author: {self.author}."
@@ -107,6 +188,8 @@ class Recipe(models.Model):
 class Favorite(models.Model):
     """Избранные рецепты."""
 
+    counter_field = 'favorites_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -119,6 +202,11 @@ class Favorite(models.Model):
         related_name='favorits',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -132,6 +220,8 @@ class Favorite(models.Model):
 
 
 class Cart(models.Model):
+    counter_field = 'carts_count'
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -144,6 +234,11 @@ class Cart(models.Model):
         related_name='carts',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Продуктовая карзина'
@@ -157,3 +252,31 @@ class Cart(models.Model):
 
     def __str__(self) -> str:
         return self.recipe.name
+
+
+class RecipeRanking(models.Model):
+    """Рейтинги рецептов для сортировки по популярности и тренду.
+
+    Пересчитывается командой refresh_rankings.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    popularity = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Тренд', default=0)
+    updated_at = models.DateTimeField('Дата пересчета', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popularity'], name='ranking_popularity_idx'
+            ),
+            models.Index(fields=['-trending'], name='ranking_trending_idx'),
+        ]
@@ -1,5 +1,195 @@
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """Keyset-пагинация по полям сортировки queryset-а.
+
+    Курсор хранит значения полей сортировки последней записи страницы,
+    следующая страница выбирается условием WHERE (pub_date, id) < (...),
+    без OFFSET. К сортировке всегда добавляется первичный ключ, чтобы
+    позиция была однозначной. Общее количество считается только по
+    запросу (?count=true) и кэшируется.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = [
+            field
+            for field in (
+                queryset.query.order_by or queryset.model._meta.ordering
+            )
+            if isinstance(field, str)
+        ]
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def encode_cursor(self, values, depth):
+        data = json.dumps({'v': values, 'd': depth}, default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def _load_cursor(encoded):
+        return json.loads(base64.urlsafe_b64decode(encoded.encode()))
+
+    @classmethod
+    def get_depth(cls, request):
+        """Номер страницы из курсора запроса, None - курсор некорректен."""
+        encoded = request.query_params.get(cls.cursor_query_param)
+        if not encoded:
+            return 0
+        try:
+            return int(cls._load_cursor(encoded)['d'])
+        except (TypeError, ValueError, KeyError):
+            return None
+
+    def decode_cursor(self, queryset, ordering):
+        encoded = self.request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, 0
+        try:
+            data = self._load_cursor(encoded)
+            if len(data['v']) != len(ordering):
+                raise ValueError
+            values = [
+                self._get_field(queryset, field).to_python(value)
+                for field, value in zip(ordering, data['v'])
+            ]
+            return values, int(data['d'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _get_field(queryset, field):
+        annotation = queryset.query.annotations.get(field.lstrip('-'))
+        if annotation is not None:
+            return annotation.output_field
+        model = queryset.model
+        *relations, name = field.lstrip('-').split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    @staticmethod
+    def _get_value(obj, field):
+        for name in field.lstrip('-').split('__'):
+            obj = getattr(obj, name)
+        return obj
+
+    @staticmethod
+    def _after(ordering, values):
+        """Условие "строго после" для лексикографической сортировки."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*ordering)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = self.get_count(queryset)
+
+        values, self.depth = self.decode_cursor(queryset, ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        page = list(queryset[: self.page_size + 1])
+        self.next_cursor = None
+        if len(page) > self.page_size:
+            page = page[: self.page_size]
+            self.next_cursor = self.encode_cursor(
+                [self._get_value(page[-1], field) for field in ordering],
+                self.depth + 1,
+            )
+        return page
+
+    def get_count(self, queryset):
+        """Количество записей, закэшированное по тексту запроса.
+
+        Если условие заведомо ничего не находит (например, фильтр по
+        пустому избранному), SQL не строится и записей нет.
+        """
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+        key = 'keyset-count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.KEYSET_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ('count', self.count),
+                    ('next', self.get_next_link()),
+                    ('previous', None),
+                    ('results', data),
+                ]
+            )
+        )
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с переключением на keyset.
+
+    Если в запросе есть параметр cursor (для первой страницы - пустой),
+    для queryset-ов используется KeysetPagination, иначе обычные номера
+    страниц.
+    """
+
     page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (
+            isinstance(queryset, QuerySet)
+            and KeysetPagination.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,58 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_entity_too_large'
+
+
+class _LimitedReader:
+    """Чтение потока частями с обрывом при превышении лимита."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def read(self, size=-1):
+        if size is not None and size >= 0:
+            return self._consume(self.stream.read(size))
+        chunks = []
+        while chunk := self.stream.read(CHUNK_SIZE):
+            chunks.append(self._consume(chunk))
+        return b''.join(chunks)
+
+    def _consume(self, chunk):
+        self.consumed += len(chunk)
+        if self.consumed > self.limit:
+            raise RequestEntityTooLarge()
+        return chunk
+
+
+class LimitedJSONParser(JSONParser):
+    """JSONParser с ограничением размера тела запроса.
+
+    Запрос с заявленным Content-Length больше RECIPE_MAX_BODY_SIZE
+    отклоняется до чтения тела, без заголовка тело читается частями до
+    лимита.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = settings.RECIPE_MAX_BODY_SIZE
+        request = (parser_context or {}).get('request')
+        if request is not None:
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                raise ParseError('Некорректный заголовок Content-Length.')
+            if content_length > limit:
+                raise RequestEntityTooLarge()
+        return super().parse(
+            _LimitedReader(stream, limit), media_type, parser_context
+        )
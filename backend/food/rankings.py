@@ -0,0 +1,80 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from food.cache import bump_version_on_commit
+from food.models import Cart, Favorite, Recipe, RecipeRanking
+
+POPULARITY = (
+    F('favorites_count') * settings.RANKING_FAVORITE_WEIGHT
+    + F('carts_count') * settings.RANKING_CART_WEIGHT
+)
+
+
+def trending_scores(now):
+    """Взвешенная сумма добавлений в избранное и корзину с затуханием.
+
+    Вес каждого добавления уменьшается вдвое за
+    RANKING_TRENDING_HALF_LIFE_HOURS, старше окна не учитываются.
+    """
+    since = now - timedelta(days=settings.RANKING_TRENDING_WINDOW_DAYS)
+    half_life = settings.RANKING_TRENDING_HALF_LIFE_HOURS * 3600
+    scores = defaultdict(float)
+    for model, weight in (
+        (Favorite, settings.RANKING_FAVORITE_WEIGHT),
+        (Cart, settings.RANKING_CART_WEIGHT),
+    ):
+        events = model.objects.filter(created_at__gte=since).values_list(
+            'recipe_id', 'created_at'
+        )
+        for recipe_id, created_at in events.iterator():
+            age = (now - created_at).total_seconds()
+            scores[recipe_id] += weight * 0.5 ** (age / half_life)
+    return scores
+
+
+@transaction.atomic
+def refresh_rankings():
+    """Инкрементальный пересчет таблицы рейтингов.
+
+    Перезаписываются только строки, значения которых изменились:
+    популярность - одним UPDATE по расхождению со счетчиками рецепта,
+    тренд - по событиям в окне и обнулением выпавших из окна.
+    """
+    missing = Recipe.objects.filter(ranking__isnull=True).values_list(
+        'id', flat=True
+    )
+    created = RecipeRanking.objects.bulk_create(
+        (RecipeRanking(recipe_id=recipe_id) for recipe_id in missing),
+        ignore_conflicts=True,
+    )
+
+    popularity = Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe'))
+        .annotate(popularity=POPULARITY)
+        .values('popularity')
+    )
+    popular = RecipeRanking.objects.exclude(popularity=popularity).update(
+        popularity=popularity
+    )
+
+    scores = trending_scores(timezone.now())
+    rankings = RecipeRanking.objects.filter(recipe_id__in=scores)
+    for ranking in rankings:
+        ranking.trending = scores[ranking.recipe_id]
+    RecipeRanking.objects.bulk_update(rankings, ['trending'], batch_size=500)
+    faded = (
+        RecipeRanking.objects.filter(trending__gt=0)
+        .exclude(recipe_id__in=scores)
+        .update(trending=0)
+    )
+    bump_version_on_commit('recipes')
+    return {
+        'created': len(created),
+        'popularity': popular,
+        'trending': len(rankings) + faded,
+    }
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from blog_backend.db.routing import primary_reads
+from food.cache import bump_version_on_commit, get_version
+from food.feed import user_namespace
+from food.models import Cart, Favorite
+from users.models import User
+
+
+def get_recipe_ids(model, user_id):
+    """Id рецептов пользователя в избранном (Favorite) или корзине (Cart).
+
+    Множество загружается из БД при первом обращении и хранится в кэше
+    Django под версией пространства пользователя, дальше проверка
+    принадлежности не обращается к БД. Любое изменение избранного или
+    корзины меняет версию после коммита, поэтому множество не
+    дописывается на месте и не перезаписывается устаревшим чтением.
+    """
+    version = get_version(user_namespace(user_id))
+    key = f'relations:{model._meta.model_name}:{user_id}:{version}'
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        with primary_reads():
+            recipe_ids = frozenset(
+                model.objects.filter(user_id=user_id).values_list(
+                    'recipe_id', flat=True
+                )
+            )
+        cache.set(key, recipe_ids, settings.RELATIONS_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+def lock_relations(user_id):
+    """Блокировка строки пользователя до конца транзакции.
+
+    Все записи избранного и корзины пользователя проходят под ней,
+    поэтому прочитанные в транзакции связи не меняются до ее коммита и
+    счетчики рецептов считаются по реально добавленным строкам.
+    """
+    list(User.objects.select_for_update().filter(pk=user_id).values('pk'))
+
+
+def relations_changed(user_id, model):
+    """Обновление кэшей после изменения избранного или корзины.
+
+    Единственный путь инвалидации для API и админки. Вызывается внутри
+    транзакции, кэши меняются после ее коммита.
+    """
+    bump_version_on_commit(user_namespace(user_id))
+    if model is Favorite:
+        bump_version_on_commit('recipe-counters')
+
+
+class UserRelations:
+    """Избранное и корзина пользователя, загружаются по требованию."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def _recipe_ids(self, model):
+        if self.user.is_anonymous:
+            return frozenset()
+        return get_recipe_ids(model, self.user.id)
+
+    @cached_property
+    def favorites(self):
+        return self._recipe_ids(Favorite)
+
+    @cached_property
+    def cart(self):
+        return self._recipe_ids(Cart)
+
+
+def user_relations(request):
+    """Общий для фильтров и сериализаторов UserRelations запроса."""
+    relations = getattr(request, '_recipe_relations', None)
+    if relations is None:
+        relations = request._recipe_relations = UserRelations(request.user)
+    return relations
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast
+
+from food.models import RecipeIngredient
+
+
+def recipe_document():
+    """Поисковый вектор рецепта: название (A), описание (B), ингредиенты (C).
+
+    Названия ингредиентов собираются коррелированным подзапросом, поэтому
+    выражение годится для UPDATE сразу многих рецептов.
+    """
+    ingredients = Subquery(
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=settings.SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=settings.SEARCH_CONFIG)
+        + SearchVector(ingredients, weight='C', config=settings.SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """Пересчет сохраненного поискового вектора одним UPDATE."""
+    if connection.vendor != 'postgresql':
+        return 0
+    return recipes.update(search_vector=recipe_document())
+
+
+def ranked(queryset, rank):
+    return queryset.annotate(search_rank=rank).order_by(
+        '-search_rank', '-pub_date', '-id'
+    )
+
+
+def search_recipes(queryset, text):
+    """Рецепты, подходящие под поисковую строку, по убыванию search_rank.
+
+    На PostgreSQL поиск идет по search_vector через GIN-индекс, ранг -
+    SearchRank. На других СУБД каждое слово ищется через icontains в
+    названии, описании и ингредиентах, а ранг грубо оценивает, где
+    нашлась фраза целиком.
+    """
+    text = text.strip()
+    if not text:
+        return queryset
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            text, config=settings.SEARCH_CONFIG, search_type='websearch'
+        )
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return ranked(queryset.filter(search_vector=query), rank)
+
+    condition = Q()
+    for word in text.split():
+        condition &= (
+            Q(name__icontains=word)
+            | Q(text__icontains=word)
+            | Exists(
+                RecipeIngredient.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__name__icontains=word
+                )
+            )
+        )
+    rank = Case(
+        When(name__icontains=text, then=Value(1.0)),
+        When(text__icontains=text, then=Value(0.4)),
+        default=Value(0.1),
+        output_field=FloatField(),
+    )
+    return ranked(queryset.filter(condition), rank)
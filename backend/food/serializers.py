@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from food.fields import StreamingBase64ImageField
+from food.images import schedule_image_processing
 from food.models import Ingredient, Recipe, RecipeIngredient, Tag
+from food.relations import user_relations
 from users.models import Follow
 from users.serializers import CustomUserSerializer
 
@@ -39,7 +42,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
         many=True,
         read_only=True,
     )
-    image = serializers.ReadOnlyField(source='image.url')
+    image = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -56,29 +59,57 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'image',
             'text',
             'cooking_time',
+            'favorites_count',
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def get_image(self, obj):
+        """В списках отдается уменьшенная карточка, если она готова."""
+        in_list = isinstance(self.parent, serializers.ListSerializer)
+        if in_list and obj.image_card:
+            return obj.image_card.url
+        return obj.image.url
+
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Recipe.objects.filter(favorits__user=user, id=obj.id).exists()
+        return obj.id in user_relations(self.context['request']).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Recipe.objects.filter(carts__user=user, id=obj.id).exists()
+        return obj.id in user_relations(self.context['request']).cart
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
+class RecipeMatchSerializer(RecipeListSerializer):
+    """Рецепт с числом совпавших и недостающих ингредиентов."""
+
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + (
+            'matched_count',
+            'missing_count',
+        )
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления или удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_RECIPES,
     )
+
+
+class RecipeCreateSerializer(serializers.ModelSerializer):
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = serializers.ListField(
         write_only=True, child=serializers.DictField()
     )
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -91,52 +122,112 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'cooking_time',
         )
 
+    def validate_tags(self, value):
+        tags = set(value)
+        existing = set(
+            Tag.objects.filter(id__in=tags).values_list('id', flat=True)
+        )
+        if tags - existing:
+            raise serializers.ValidationError(
+                {'errors': f'Несуществующие теги: {sorted(tags - existing)}.'}
+            )
+        return list(tags)
+
+    @staticmethod
+    def _to_int(value, message):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'errors': message})
+
     def validate_ingredients(self, value):
+        """Приведение ингредиентов к {id: количество} и их проверка.
+
+        Существование всех ингредиентов проверяется одним запросом.
+        """
         if not value:
             raise serializers.ValidationError(
                 {'errors': 'Добавьте ингредиенты.'}
             )
-        seen_ingredients = set()
-        duplicate_ingredients = []
-
+        amounts = {}
         for ingredient in value:
-            ingredient_name = ingredient.get('id')
-            if ingredient_name in seen_ingredients:
-                duplicate_ingredients.append(ingredient_name)
-            seen_ingredients.add(ingredient_name)
-
-        if duplicate_ingredients:
-            raise serializers.ValidationError(
-                {'error': 'Повторяющиеся ингредиенты.'}
+            ingredient_id = self._to_int(
+                ingredient.get('id'), 'Id ингредиента должен быть числом.'
+            )
+            amount = self._to_int(
+                ingredient.get('amount'), 'Количество должно быть числом.'
             )
-
-        return value
-
-    @staticmethod
-    def _create_list_ingredients(recipe_instance, ingredients_data):
-        """Добавление игредиентов к рецепту."""
-        recipe_ingredients_list = []
-        for ingredient_data in ingredients_data:
-            ingredient_id = ingredient_data.get('id')
-            amount = ingredient_data.get('amount')
-            try:
-                amount = int(amount)
-            except ValueError:
-                raise serializers.ValidationError(
-                    {'errors': 'Количество должно быть числом.'}
-                )
             if amount < 0:
                 raise serializers.ValidationError(
                     {'errors': 'Количество не может быть отрицательным.'}
                 )
-            recipe_ingredients_list.append(
-                RecipeIngredient(
-                    recipe=recipe_instance,
-                    ingredient_id=ingredient_id,
-                    amount=amount,
+            if ingredient_id in amounts:
+                raise serializers.ValidationError(
+                    {'error': 'Повторяющиеся ингредиенты.'}
                 )
+            amounts[ingredient_id] = amount
+
+        existing = set(
+            Ingredient.objects.filter(id__in=amounts).values_list(
+                'id', flat=True
+            )
+        )
+        missing = sorted(set(amounts) - existing)
+        if missing:
+            raise serializers.ValidationError(
+                {'errors': f'Несуществующие ингредиенты: {missing}.'}
+            )
+        return amounts
+
+    @staticmethod
+    def _create_list_ingredients(recipe_instance, amounts):
+        """Добавление игредиентов к рецепту."""
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe_instance,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in amounts.items()
+        )
+
+    @classmethod
+    def _update_list_ingredients(cls, recipe_instance, amounts):
+        """Изменение ингредиентов рецепта по разнице с сохраненными.
+
+        Удаляются и добавляются только исчезнувшие и новые строки,
+        измененные количества обновляются одним bulk_update.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe_instance
             )
-        RecipeIngredient.objects.bulk_create(recipe_ingredients_list)
+        }
+        removed = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        cls._create_list_ingredients(
+            recipe_instance,
+            {
+                ingredient_id: amount
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in current
+            },
+        )
 
     @transaction.atomic
     def create(self, validated_data):
@@ -147,6 +238,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             recipe.tags.set(tags_data)
 
         self._create_list_ingredients(recipe, ingredients_data)
+        schedule_image_processing(recipe)
 
         return recipe
 
@@ -154,14 +246,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags', None)
         ingredients_data = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            validated_data['image_card'] = ''
+            validated_data['image_hash'] = ''
+            schedule_image_processing(instance)
 
         instance = super().update(instance, validated_data)
         if tags_data is not None:
             instance.tags.set(tags_data)
 
         if ingredients_data is not None:
-            instance.ingredients.clear()
-            self._create_list_ingredients(instance, ingredients_data)
+            self._update_list_ingredients(instance, ingredients_data)
 
         return instance
 
@@ -171,13 +266,30 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
 
 class SimplifiedRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
+    def get_image(self, obj):
+        return (obj.image_card or obj.image).url
+
+
+def get_recipes_limit(request):
+    """Параметр recipes_limit: неотрицательное целое или None.
+
+    Некорректное значение - ValidationError, то есть ответ 400.
+    """
+    value = request.query_params.get('recipes_limit')
+    if not value:
+        return None
+    try:
+        return serializers.IntegerField(min_value=0).run_validation(value)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({'recipes_limit': error.detail})
+
 
 class FollowSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='author.id')
@@ -187,7 +299,7 @@ class FollowSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
 
     class Meta:
         model = Follow
@@ -203,16 +315,14 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return Follow.objects.filter(user=user, author=obj.author).exists()
+        return obj.user_id == self.context['request'].user.id
 
     def get_recipes(self, obj):
-        recipes = obj.author.recipes.all()
-        request = self.context['request']
-        limit = request.GET.get('recipes_limit')
-        if limit:
-            recipes = recipes[: int(limit)]
+        if hasattr(obj.author, 'recent_recipes'):
+            recipes = obj.author.recent_recipes
+        else:
+            recipes = obj.author.recipes.all()
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                recipes = recipes[:limit]
         return SimplifiedRecipeSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
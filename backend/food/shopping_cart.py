@@ -0,0 +1,42 @@
+import csv
+import json
+
+
+class _Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def _txt(ingredients):
+    for number, item in enumerate(ingredients, start=1):
+        yield (
+            f"{number} * Ингредиент: {item['name']}"
+            f": {item['total_amount']} {item['measurement_unit']}\n"
+        )
+
+
+def _csv(ingredients):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in ingredients:
+        yield writer.writerow(
+            (item['name'], item['measurement_unit'], item['total_amount'])
+        )
+
+
+def _json(ingredients):
+    yield '['
+    separator = ''
+    for item in ingredients:
+        yield separator + json.dumps(item, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'txt': (_txt, 'text/plain; charset=utf-8'),
+    'csv': (_csv, 'text/csv; charset=utf-8'),
+    'json': (_json, 'application/json'),
+}
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from food.cache import bump_version_on_commit
+from food.feed import author_namespace, follows_namespace
+from food.matching import CACHE_NAMESPACE as MATCHING_NAMESPACE
+from food.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeRanking,
+    Tag,
+)
+from food.search import update_search_vectors
+from users.models import Follow, User
+
+# Поля пользователя, которые выводятся в карточке рецепта автора.
+AUTHOR_PROFILE_FIELDS = frozenset(
+    ('username', 'first_name', 'last_name', 'email')
+)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_version_on_commit('tags')
+    bump_version_on_commit('recipes')
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_version_on_commit('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            lambda: update_search_vectors(
+                Recipe.objects.filter(ingredients=instance)
+            )
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def create_ranking(instance, created, **kwargs):
+    if created:
+        RecipeRanking.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def reindex_recipe(instance, **kwargs):
+    """Пересчет поискового вектора после коммита.
+
+    Ингредиенты записываются после сохранения рецепта в той же
+    транзакции, поэтому вектор считается в on_commit.
+    """
+    transaction.on_commit(
+        lambda: update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+    )
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_author_feed(instance, **kwargs):
+    bump_version_on_commit(author_namespace(instance.author_id))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_matching(**kwargs):
+    bump_version_on_commit(MATCHING_NAMESPACE)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follows_feed(instance, **kwargs):
+    bump_version_on_commit(follows_namespace(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_profile(instance, created, update_fields, **kwargs):
+    """Смена профиля автора устаревает его рецепты в списках и ленте.
+
+    Сохранения только служебных полей (например, last_login при входе)
+    кэши не трогают.
+    """
+    if created or (
+        update_fields is not None
+        and AUTHOR_PROFILE_FIELDS.isdisjoint(update_fields)
+    ):
+        return
+    bump_version_on_commit('recipes')
+    bump_version_on_commit(author_namespace(instance.id))
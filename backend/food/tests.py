@@ -0,0 +1,499 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from food.cache import get_version
+from food.feed import user_namespace
+from food.management.commands.check_query_plans import (
+    explain,
+    filter_combinations,
+    list_queries,
+    missing_index,
+    pick_subjects,
+    seed,
+)
+from food.matching import CACHE_NAMESPACE as MATCHING_NAMESPACE
+from food.models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeRanking,
+    Tag,
+)
+from food.search import update_search_vectors
+from users.models import Follow, User
+
+
+class RecipeQueryCountTests(TestCase):
+    """Число запросов списка и рецепта не зависит от размера страницы."""
+
+    PAGE_SIZES = (6, 50, 200)
+    LIST_QUERIES = 7
+    RETRIEVE_QUERIES = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        User.objects.bulk_create(
+            User(username=f'author_{i}', email=f'author_{i}@example.com')
+            for i in range(10)
+        )
+        authors = list(User.objects.filter(username__startswith='author_'))
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author) for author in authors[:5]
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'tag_{i}', color=f'#00000{i}', slug=f'tag_{i}')
+            for i in range(3)
+        )
+        tags = list(Tag.objects.all())
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient_{i}', measurement_unit='г')
+            for i in range(5)
+        )
+        ingredients = list(Ingredient.objects.all())
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[i % len(authors)],
+                name=f'recipe_{i}',
+                image='food/images/test.png',
+                text='text',
+            )
+            for i in range(max(cls.PAGE_SIZES))
+        )
+        recipes = list(Recipe.objects.all())
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in tags[:2]
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes
+            for ingredient in ingredients[:3]
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2]
+        )
+        Cart.objects.bulk_create(
+            Cart(user=cls.user, recipe=recipe) for recipe in recipes[::3]
+        )
+        cls.recipe = recipes[0]
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_list_query_count(self):
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                with self.assertNumQueries(self.LIST_QUERIES):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': page_size}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_retrieve_query_count(self):
+        with self.assertNumQueries(self.RETRIEVE_QUERIES):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+
+class QueryPlanTests(TestCase):
+    """Планы и число запросов для каждой комбинации фильтров рецептов.
+
+    На PostgreSQL после ANALYZE планировщик выбирает план по настоящей
+    статистике, и план первой страницы должен использовать индекс из
+    EXPECTED_INDEXES.
+    """
+
+    RECIPES = 5000
+    MAX_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(cls.RECIPES)
+        cls.user, cls.author, cls.tags = pick_subjects()
+
+    def setUp(self):
+        cache.clear()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def test_filter_combinations(self):
+        combinations = filter_combinations(self.author, self.tags)
+        for name, params in combinations.items():
+            with self.subTest(name):
+                response, count = list_queries(params, self.user)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(count, self.MAX_QUERIES)
+                if connection.vendor == 'postgresql':
+                    plan = explain(params, self.user)
+                    self.assertIsNone(missing_index(name, plan), plan)
+
+
+class CounterFieldsTests(TestCase):
+    """Полное сохранение записи не перезаписывает счетчики."""
+
+    def test_save_keeps_counters(self):
+        author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='recipe', image='food/images/test.png'
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=3)
+        User.objects.filter(pk=author.pk).update(followers_count=2)
+        recipe.name = 'renamed'
+        recipe.save()
+        author.first_name = 'Имя'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual((recipe.name, recipe.favorites_count), ('renamed', 3))
+        self.assertEqual(
+            (author.first_name, author.followers_count), ('Имя', 2)
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """Проход по курсорам совпадает с полным списком без пропусков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.user,
+                name=f'борщ {i}' if i % 3 else f'суп {i}',
+                image='food/images/test.png',
+                text='text',
+            )
+            for i in range(13)
+        )
+        recipes = list(Recipe.objects.order_by('id'))
+        # У части рецептов нет строки рейтинга, у части баллы совпадают.
+        RecipeRanking.objects.bulk_create(
+            RecipeRanking(
+                recipe=recipe, popularity=i % 4, trending=(i * 7) % 5
+            )
+            for i, recipe in enumerate(recipes[:10])
+        )
+        update_search_vectors(Recipe.objects.all())
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _ids(self, params):
+        response = self.client.get('/api/recipes/', {**params, 'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def _walk(self, params, page_size=4):
+        """Id рецептов со всех страниц, пройденных по ссылкам next."""
+        response = self.client.get(
+            '/api/recipes/', {**params, 'cursor': '', 'limit': page_size}
+        )
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            page = [recipe['id'] for recipe in response.data['results']]
+            self.assertLessEqual(len(page), page_size)
+            ids.extend(page)
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_round_trip(self):
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        self.assertEqual(self._walk({}), expected)
+
+    def test_ranking_orderings(self):
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering):
+                params = {'ordering': ordering}
+                ids = self._walk(params)
+                self.assertEqual(ids, self._ids(params))
+                self.assertEqual(len(ids), 13)
+
+    def test_search_rank(self):
+        params = {'search': 'борщ'}
+        ids = self._walk(params, page_size=3)
+        self.assertEqual(ids, self._ids(params))
+        self.assertEqual(len(ids), 8)
+
+    def test_count(self):
+        response = self.client.get(
+            '/api/recipes/', {'cursor': '', 'count': 'true'}
+        )
+        self.assertEqual(response.data['count'], 13)
+        response = self.client.get(
+            '/api/recipes/',
+            {'cursor': '', 'count': 'true', 'is_favorited': 1},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['results'], [])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeRelationAdminTests(TestCase):
+    """Изменения избранного и корзины из админки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.admin, name='recipe', image='food/images/test.png'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _counters(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count, self.recipe.carts_count
+
+    def _post(self, url, data):
+        version = get_version(user_namespace(self.admin.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotEqual(
+            get_version(user_namespace(self.admin.id)), version
+        )
+
+    def test_add_and_delete(self):
+        for model, counters in ((Favorite, (1, 0)), (Cart, (0, 1))):
+            with self.subTest(model.__name__):
+                url = f'/admin/food/{model._meta.model_name}/'
+                self._post(
+                    f'{url}add/',
+                    {'user': self.admin.id, 'recipe': self.recipe.id},
+                )
+                self.assertEqual(self._counters(), counters)
+                relation = model.objects.get()
+                self._post(f'{url}{relation.id}/delete/', {'post': 'yes'})
+                self.assertEqual(self._counters(), (0, 0))
+
+    def test_delete_selected(self):
+        Favorite.objects.create(user=self.admin, recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=1)
+        self._post(
+            '/admin/food/favorite/',
+            {
+                'action': 'delete_selected',
+                '_selected_action': list(
+                    Favorite.objects.values_list('id', flat=True)
+                ),
+                'post': 'yes',
+            },
+        )
+        self.assertEqual(self._counters(), (0, 0))
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_fast_delete(self):
+        """Без сигналов на связях удаление идет одним DELETE."""
+        for model in (Favorite, Cart):
+            with self.subTest(model.__name__):
+                self.assertTrue(
+                    Collector(using='default').can_fast_delete(
+                        model.objects.all()
+                    )
+                )
+
+
+class AuthorProfileCacheTests(TestCase):
+    """Изменение профиля автора сбрасывает отпечатки его рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='recipe', image='food/images/test.png'
+        )
+        cls.reader = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_profile_change(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.id}/'):
+            with self.subTest(url):
+                etag = self.client.get(url)['ETag']
+                self.author.first_name = url
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.author.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                recipe = response.data.get('results', [response.data])[0]
+                self.assertEqual(recipe['author']['first_name'], url)
+
+    def test_service_fields(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save(update_fields=['last_login'])
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class BatchRelationsTests(TestCase):
+    """Статусы пакетных операций и счетчики рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'recipe_{i}', image='food/images/t.png'
+            )
+            for i in range(3)
+        ]
+        cls.ids = [recipe.id for recipe in cls.recipes]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _batch(self, method, url, recipe_ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data['results']]
+
+    def _counters(self, field):
+        return list(
+            Recipe.objects.filter(id__in=self.ids)
+            .order_by('id')
+            .values_list(field, flat=True)
+        )
+
+    def test_statuses_and_counters(self):
+        first, second, third = self.ids
+        for name, field in (
+            ('favorite', 'favorites_count'),
+            ('shopping_cart', 'carts_count'),
+        ):
+            with self.subTest(name):
+                url = f'/api/recipes/{name}/batch/'
+                self.assertEqual(
+                    self._batch('post', url, [first, second, 999, first]),
+                    ['added', 'added', 'not_found'],
+                )
+                self.assertEqual(self._counters(field), [1, 1, 0])
+                self.assertEqual(
+                    self._batch('post', url, [first, third]),
+                    ['exists', 'added'],
+                )
+                self.assertEqual(self._counters(field), [1, 1, 1])
+                response = self.client.delete(f'/api/recipes/{first}/{name}/')
+                self.assertEqual(response.status_code, 204)
+                self.assertEqual(
+                    self._batch('delete', url, [first, second, third]),
+                    ['absent', 'removed', 'removed'],
+                )
+                self.assertEqual(self._counters(field), [0, 0, 0])
+                response = self.client.post(f'/api/recipes/{first}/{name}/')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(self._counters(field), [1, 0, 0])
+
+
+class DownloadShoppingCartTests(TestCase):
+    """Выгрузка корзины: только для авторизованных, суммы по ингредиенту."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        for amount in (2, 3):
+            recipe = Recipe.objects.create(
+                author=cls.user, name='recipe', image='food/images/t.png'
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+            Cart.objects.create(user=cls.user, recipe=recipe)
+
+    def test_anonymous(self):
+        response = APIClient().get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_download(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.get(
+            '/api/recipes/download_shopping_cart/', {'file_format': 'csv'}
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('соль,г,5', content)
+
+
+class MatchingInvalidationTests(TestCase):
+    """Изменение состава рецепта меняет версию индекса подбора."""
+
+    def test_recipe_ingredient_changes(self):
+        author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='recipe', image='food/images/t.png'
+        )
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        version = get_version(MATCHING_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True):
+            relation = RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        self.assertNotEqual(get_version(MATCHING_NAMESPACE), version)
+        version = get_version(MATCHING_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True):
+            relation.delete()
+        self.assertNotEqual(get_version(MATCHING_NAMESPACE), version)
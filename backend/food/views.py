@@ -1,12 +1,32 @@
-from django.db.models import Prefetch, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters import rest_framework as django_filters
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 
+from blog_backend.db.routing import primary_reads
+from food.autocomplete import ingredient_index
+from food.cache import (
+    AnonymousCacheMixin,
+    CatalogueCacheMixin,
+    ConditionalGetMixin,
+    get_version,
+    get_versions,
+)
+from food.feed import (
+    author_namespace,
+    feed_cache_key,
+    follows_namespace,
+    user_namespace,
+)
 from food.filter import IngredientSearchFilter, RecipeFilter
+from food.matching import recipe_match_index
 from food.models import (
     Cart,
     Favorite,
@@ -15,17 +35,27 @@ from food.models import (
     RecipeIngredient,
     Tag,
 )
+from food.pagination import KeysetPagination
+from food.parsers import LimitedJSONParser
 from food.permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
+from food.relations import lock_relations, relations_changed
 from food.serializers import (
     IngredientsSerializer,
+    RecipeBatchSerializer,
     RecipeCreateSerializer,
     RecipeListSerializer,
+    RecipeMatchSerializer,
     SimplifiedRecipeSerializer,
     TagSerializer,
 )
+from food.shopping_cart import EXPORT_FORMATS
+from users.models import User
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(
+    CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet
+):
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -33,23 +63,121 @@ class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('^name',)
     pagination_class = None
 
+    @action(
+        detail=False,
+        methods=['GET'],
+    )
+    def autocomplete(self, request: HttpResponse):
+        """Подсказки ингредиентов по началу названия.
+
+        Параметры: name - вводимый текст, limit - число подсказок.
+        """
+        try:
+            limit = int(
+                request.query_params.get('limit', settings.AUTOCOMPLETE_LIMIT)
+            )
+        except ValueError:
+            return Response(
+                {'errors': 'limit должен быть числом.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+        query = request.query_params.get('name', '')
+        return Response(ingredient_index.search(query, limit))
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = [IsAdminOrReadOnly]
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, AnonymousCacheMixin, viewsets.ModelViewSet
+):
+    anonymous_cache_namespace = 'recipes'
     queryset = Recipe.objects.all()
     serializer_class = RecipeListSerializer
     filter_backends = (django_filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [IsOwnerOrReadOnly]
+    parser_classes = (LimitedJSONParser, FormParser, MultiPartParser)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = queryset.for_read(self.request.user)
+        return queryset
+
+    def _fingerprint_versions(self, request, namespaces):
+        user = request.user
+        if not user.is_anonymous:
+            namespaces = namespaces + [
+                user_namespace(user.id),
+                follows_namespace(user.id),
+            ]
+        return [
+            version or get_version(namespace)
+            for namespace, version in zip(namespaces, get_versions(namespaces))
+        ]
+
+    def get_list_fingerprint(self, request):
+        """Отпечаток списка из версий кэша, без запросов к БД.
+
+        Анонимам списки отдает AnonymousCacheMixin, в том числе
+        устаревшие записи, поэтому для них отпечаток не считается.
+        """
+        if request.user.is_anonymous:
+            return None
+        versions = self._fingerprint_versions(
+            request, ['recipes', 'recipe-counters', 'tags', 'ingredients']
+        )
+        return versions, max(versions)
+
+    def get_object_fingerprint(self, request, *args, **kwargs):
+        """Отпечаток рецепта: updated_at, счетчик избранного и автор.
 
+        Счетчик меняется без updated_at, поэтому в Last-Modified входит
+        версия recipe-counters, а в ETag - только сам счетчик рецепта.
+        Профиль автора меняет версию его пространства.
+        """
+        try:
+            state = (
+                Recipe.objects.filter(pk=kwargs[self.lookup_field])
+                .values_list('updated_at', 'favorites_count', 'author_id')
+                .first()
+            )
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            return None
+        counters, *versions = self._fingerprint_versions(
+            request,
+            [
+                'recipe-counters',
+                author_namespace(state[2]),
+                'tags',
+                'ingredients',
+            ],
+        )
+        last_modified = max(state[0].timestamp(), counters, *versions)
+        return (state, versions), last_modified
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+            recipes_count=F('recipes_count') - 1
+        )
+        instance.delete()
 
     def get_serializer_class(self):
         if self.request.method not in permissions.SAFE_METHODS:
@@ -71,11 +199,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
             pk - primary key/id - айди из url запроса для обращения.
         """
         recipe = get_object_or_404(Recipe, id=pk)
+        counter = Recipe.objects.filter(pk=recipe.pk)
+        counter_field = instance.counter_field
 
         if request.method == 'POST':
-            _, created = instance.objects.get_or_create(
-                user=request.user, recipe=recipe
-            )
+            with transaction.atomic():
+                lock_relations(request.user.id)
+                _, created = instance.objects.get_or_create(
+                    user=request.user, recipe=recipe
+                )
+                if created:
+                    counter.update(**{counter_field: F(counter_field) + 1})
+                    relations_changed(request.user.id, instance)
             serializer = SimplifiedRecipeSerializer(recipe)
             if not created:
                 return Response(
@@ -84,9 +219,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        favorite = instance.objects.filter(user=request.user, recipe=recipe)
-        if favorite.exists():
-            favorite.delete()
+        with transaction.atomic():
+            lock_relations(request.user.id)
+            deleted, _ = instance.objects.filter(
+                user=request.user, recipe=recipe
+            ).delete()
+            if deleted:
+                # Разошедшийся со связями счетчик не уходит ниже нуля.
+                counter.filter(**{f'{counter_field}__gt': 0}).update(
+                    **{counter_field: F(counter_field) - 1}
+                )
+                relations_changed(request.user.id, instance)
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(
@@ -94,6 +238,66 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @staticmethod
+    def _batch_relations(request: HttpResponse, instance: object):
+        """Пакетное создание/разрыв связей пользователя с рецептами.
+
+        Id рецептов проверяются одним запросом, связи создаются одним
+        bulk_create или удаляются одним DELETE. Для каждого id
+        возвращается результат: added, exists, removed, absent или
+        not_found.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                'id', flat=True
+            )
+        )
+        counter_field = instance.counter_field
+        with transaction.atomic():
+            lock_relations(request.user.id)
+            related = set(
+                instance.objects.filter(
+                    user=request.user, recipe_id__in=found
+                ).values_list('recipe_id', flat=True)
+            )
+            if request.method == 'POST':
+                changed = found - related
+                # Под блокировкой связи пользователя не меняются, поэтому
+                # вставляются ровно строки changed, без конфликтов.
+                instance.objects.bulk_create(
+                    instance(user=request.user, recipe_id=recipe_id)
+                    for recipe_id in changed
+                )
+                delta, statuses = 1, ('added', 'exists')
+            else:
+                changed = related
+                instance.objects.filter(
+                    user=request.user, recipe_id__in=changed
+                ).delete()
+                delta, statuses = -1, ('removed', 'absent')
+            if changed:
+                counters = Recipe.objects.filter(id__in=changed)
+                if delta < 0:
+                    counters = counters.filter(**{f'{counter_field}__gt': 0})
+                counters.update(**{counter_field: F(counter_field) + delta})
+                relations_changed(request.user.id, instance)
+
+        results = [
+            {
+                'id': recipe_id,
+                'status': (
+                    'not_found'
+                    if recipe_id not in found
+                    else statuses[recipe_id not in changed]
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]
+        return Response({'results': results})
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -110,45 +314,145 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Добавление рецепта в карзину пользователя."""
         return self._relations(request, Cart, 'Карзина', pk)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite/batch',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_batch(self, request: HttpResponse):
+        """Добавление/удаление списка рецептов в избранном."""
+        return self._batch_relations(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart/batch',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_batch(self, request: HttpResponse):
+        """Добавление/удаление списка рецептов в карзине."""
+        return self._batch_relations(request, Cart)
+
     @action(
         detail=False,
         methods=['GET'],
+        permission_classes=[permissions.IsAuthenticated],
     )
-    def download_shopping_cart(self, request: HttpResponse):
-        """Парс данных рецепта из карзины и скачивание данных пользователем."""
-        cart_recipes = Cart.objects.filter(user=request.user).values_list(
-            'recipe', flat=True
+    def feed(self, request: HttpResponse):
+        """Лента рецептов авторов из подписок пользователя.
+
+        Рецепты выбираются одним запросом с JOIN по подпискам и
+        keyset-пагинацией, фильтры списка рецептов тоже работают.
+        Первые страницы ленты кэшируются, см. feed_cache_key.
+        """
+        key = feed_cache_key(request)
+        data = cache.get(key) if key else None
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                author__following__user=request.user
+            )
+            paginator = KeysetPagination(self.paginator.get_page_size(request))
+            with primary_reads():
+                page = paginator.paginate_queryset(queryset, request, self)
+                serializer = self.get_serializer(page, many=True)
+                data = paginator.get_paginated_response(serializer.data).data
+            if key:
+                cache.set(key, data, settings.FEED_CACHE_TIMEOUT)
+        return Response(data)
+
+    @staticmethod
+    def _ingredient_ids(request: HttpResponse):
+        """Id ингредиентов через запятую или повтором параметра."""
+        return {
+            int(value)
+            for param in request.query_params.getlist('ingredients')
+            for value in param.split(',')
+            if value.strip()
+        }
+
+    @action(
+        detail=False,
+        methods=['GET'],
+    )
+    def match(self, request: HttpResponse):
+        """Рецепты, которые можно приготовить из своих ингредиентов.
+
+        Рецепты подбираются по инвертированному индексу в памяти и
+        сортируются по числу недостающих ингредиентов, затем по доле
+        совпавших. Из БД читается только текущая страница.
+        """
+        try:
+            ingredient_ids = self._ingredient_ids(request)
+        except ValueError:
+            return Response(
+                {'errors': 'ingredients должен быть списком id.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 < len(ingredient_ids) <= settings.MATCH_MAX_INGREDIENTS:
+            return Response(
+                {
+                    'errors': 'Укажите от 1 до '
+                    f'{settings.MATCH_MAX_INGREDIENTS} ингредиентов.'
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        page = self.paginate_queryset(
+            recipe_match_index.match(ingredient_ids)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, *_ in page]
+        )
+        results = []
+        for recipe_id, matched, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_count = matched
+            recipe.missing_count = missing
+            results.append(recipe)
+        serializer = RecipeMatchSerializer(
+            results, many=True, context=self.get_serializer_context()
         )
+        return self.get_paginated_response(serializer.data)
 
-        recipes_with_ingredients = (
-            Recipe.objects.filter(pk__in=cart_recipes)
-            .select_related('author')
-            .prefetch_related(
-                Prefetch(
-                    'recipeingredient_set',
-                    queryset=RecipeIngredient.objects.select_related(
-                        'ingredient'
-                    )
-                    .annotate(total_amount=Sum('amount'))
-                    .all(),
-                    to_attr='ingredients_with_amounts',
-                )
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def download_shopping_cart(self, request: HttpResponse):
+        """Скачивание суммарного списка ингредиентов из карзины.
+
+        Суммирование выполняется в БД одним GROUP BY по ингредиенту,
+        файл формируется потоком. Формат выбирается параметром file_format:
+        txt (по умолчанию), csv или json.
+        """
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': f'Доступные форматы: {", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        render, content_type = EXPORT_FORMATS[file_format]
+
+        # Строки выбираются здесь: в режиме ASGI Django 3.2 перебирает
+        # потоковый ответ в цикле событий, где запросы к БД запрещены.
+        ingredients = list(
+            RecipeIngredient.objects.filter(recipe__carts__user=request.user)
+            .values(
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit'),
             )
+            .annotate(total_amount=Sum('amount'))
+            .order_by('name')
         )
 
-        response_text = ""
-        for recipe in recipes_with_ingredients:
-            response_text += f"Рецепт: {recipe.name}\n"
-            count = 0
-            for ingredient_with_amount in recipe.ingredients_with_amounts:
-                count += 1
-                ingredient = ingredient_with_amount.ingredient
-                response_text += f"{count} * Ингредиент: {ingredient.name}"
-                response_text += f": {ingredient_with_amount.total_amount}"
-                response_text += f" {ingredient.measurement_unit}\n"
-
-        response = HttpResponse(response_text, content_type='text/plain')
+        response = StreamingHttpResponse(
+            render(ingredients), content_type=content_type
+        )
         response[
             'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
+        ] = f'attachment; filename="shopping_cart.{file_format}"'
         return response
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_author_user_idx',
+        ),
+    ]
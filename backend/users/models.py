@@ -2,9 +2,12 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 
+from blog_backend.db.models import CounterFieldsMixin
 
-class User(AbstractUser):
+
+class User(CounterFieldsMixin, AbstractUser):
     username_validator = UnicodeUsernameValidator()
+    counter_fields = ('recipes_count', 'followers_count')
     USER = 'user'
     ADMIN = 'admin'
 
@@ -18,6 +21,14 @@ class User(AbstractUser):
         default=USER,
         max_length=50,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
 
     class Meta:
         ordering = ('id',)
@@ -0,0 +1,62 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from food.models import Recipe
+from users.models import Follow, User
+
+
+class RecipesLimitTests(TestCase):
+    """Параметр recipes_limit подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        for i in range(3):
+            Recipe.objects.create(
+                author=cls.author, name=f'recipe_{i}', image='food/t.png'
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _subscriptions(self, recipes_limit):
+        return self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': recipes_limit}
+        )
+
+    def test_valid_limit(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        for recipes_limit, expected in (('', 3), ('0', 0), ('2', 2)):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self._subscriptions(recipes_limit)
+                self.assertEqual(response.status_code, 200)
+                recipes = response.data['results'][0]['recipes']
+                self.assertEqual(len(recipes), expected)
+
+    def test_invalid_limit(self):
+        for recipes_limit in ('x', '-1', '1.5'):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self._subscriptions(recipes_limit)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+                response = self.client.post(
+                    f'/api/users/{self.author.id}/subscribe/'
+                    f'?recipes_limit={recipes_limit}'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_subscribe_limit(self):
+        response = self.client.post(
+            f'/api/users/{self.author.id}/subscribe/?recipes_limit=1'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['recipes']), 1)
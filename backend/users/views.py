@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery
 from django.http import HttpRequest
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -5,15 +7,46 @@ from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
-from food.serializers import FollowSerializer
+from food.models import Recipe
+from food.serializers import FollowSerializer, get_recipes_limit
 from users.models import Follow, User
 
 
 class FollowUsers(UserViewSet):
+    @staticmethod
+    def _subscriptions_queryset(user, recipes_limit):
+        """Подписки с последними рецептами авторов.
+
+        Последние recipes_limit рецептов каждого автора выбираются одним
+        prefetch-запросом с коррелированным подзапросом LIMIT.
+        """
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.filter(
+                id__in=Subquery(
+                    Recipe.objects.filter(author=OuterRef('author'))
+                    .order_by('-pub_date', '-id')
+                    .values('id')[:recipes_limit]
+                )
+            )
+        return (
+            Follow.objects.filter(user=user)
+            .select_related('author')
+            .prefetch_related(
+                Prefetch(
+                    'author__recipes',
+                    queryset=recipes,
+                    to_attr='recent_recipes',
+                )
+            )
+            .order_by('-id')
+        )
+
     @action(detail=False, methods=['GET'])
     def subscriptions(self, request: HttpRequest):
-        user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = self._subscriptions_queryset(
+            request.user, get_recipes_limit(request)
+        )
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages, many=True, context={'request': request}
@@ -24,6 +57,8 @@ class FollowUsers(UserViewSet):
     def subscribe(self, request: HttpRequest, id=None):
         user = request.user
         author = get_object_or_404(User, id=id)
+        # Параметр ответа проверяется до создания подписки.
+        get_recipes_limit(request)
         if user.username == author.username:
             return Response(
                 {'errors': 'Самоподписка запрещена.'},
@@ -34,15 +69,23 @@ class FollowUsers(UserViewSet):
                 {'errors': 'Вы уже подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        queryset, _ = Follow.objects.get_or_create(author=author, user=user)
+        with transaction.atomic():
+            queryset, created = Follow.objects.get_or_create(
+                author=author, user=user
+            )
+            if created:
+                User.objects.filter(pk=author.pk).update(
+                    followers_count=F('followers_count') + 1
+                )
         serializer = FollowSerializer(queryset, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
+    @transaction.atomic
     def unsubscribe(self, request: HttpRequest, id=None):
-        get_object_or_404(
-            Follow,
-            user=request.user,
-            author=get_object_or_404(User, id=id),
-        ).delete()
+        author = get_object_or_404(User, id=id)
+        get_object_or_404(Follow, user=request.user, author=author).delete()
+        User.objects.filter(pk=author.pk, followers_count__gt=0).update(
+            followers_count=F('followers_count') - 1
+        )
         return Response(status=status.HTTP_204_NO_CONTENT)